@@ -5,7 +5,8 @@ import os
 import shutil
 import urllib.request
 import zipfile
-from typing import Dict, List
+from operator import itemgetter
+from typing import Dict, List, Tuple
 
 import numpy as np
 import pandas as pd
@@ -29,7 +30,7 @@ from dynamicemb.planner import (
 from dynamicemb.shard import DynamicEmbeddingCollectionSharder
 from fbgemm_gpu.split_embedding_configs import EmbOptimType, SparseType
 from torch.optim import Adam
-from torch.utils.data import DataLoader, Dataset
+from torch.utils.data import DataLoader, Dataset, Subset
 from torch.utils.data.distributed import DistributedSampler
 from torchrec import DataType
 from torchrec.distributed.comm import get_local_size
@@ -133,152 +134,189 @@ def parse_args():
     parser.add_argument(
         "--seed", type=int, default=42, help="random seed used for initialization"
     )
+    parser.add_argument(
+        "--comm_dtype",
+        type=str,
+        default="bf16",
+        choices=["fp32", "bf16", "fp16"],
+        help="precision of the embedding all-to-all in forward and backward",
+    )
     return parser.parse_args()
 
 
-class MovieLensDataset(Dataset):
-    def __init__(self, data_path: str, split: str = "train"):
-        ratings_file = os.path.join(data_path, "ratings.dat")
-        if not os.path.exists(ratings_file):
-            raise FileNotFoundError(f": {ratings_file}")
-
-        ratings_data = []
-        with open(ratings_file, "r", encoding="ISO-8859-1") as f:
-            for line in f:
-                user_id, movie_id, rating, timestamp = line.strip().split("::")
-                ratings_data.append(
-                    {
-                        "user_id": int(user_id),
-                        "movie_id": int(movie_id),
-                        "rating": float(rating),
-                        "timestamp": int(timestamp),
-                    }
-                )
+def parse_movielens(data_path: str) -> pd.DataFrame:
+    ratings_file = os.path.join(data_path, "ratings.dat")
+    if not os.path.exists(ratings_file):
+        raise FileNotFoundError(f": {ratings_file}")
+
+    # "::" is a multi-character separator, which needs the python engine.
+    ratings_df = pd.read_csv(
+        ratings_file,
+        sep="::",
+        engine="python",
+        header=None,
+        names=["user_id", "movie_id", "rating", "timestamp"],
+        encoding="ISO-8859-1",
+    ).astype(
+        {
+            "user_id": np.int32,
+            "movie_id": np.int32,
+            "rating": np.float32,
+            "timestamp": np.int64,
+        }
+    )
 
-        ratings_df = pd.DataFrame(ratings_data)
-
-        users_file = os.path.join(data_path, "users.dat")
-        movies_file = os.path.join(data_path, "movies.dat")
-
-        users_data = []
-        with open(users_file, "r", encoding="ISO-8859-1") as f:
-            for line in f:
-                parts = line.strip().split("::")
-                user_id = int(parts[0])
-                gender = 1 if parts[1] == "M" else 0
-                age = int(parts[2])
-                occupation = int(parts[3])
-                users_data.append(
-                    {
-                        "user_id": user_id,
-                        "gender": gender,
-                        "age": age,
-                        "occupation": occupation,
-                    }
-                )
+    users_file = os.path.join(data_path, "users.dat")
+    movies_file = os.path.join(data_path, "movies.dat")
+
+    users_df = pd.read_csv(
+        users_file,
+        sep="::",
+        engine="python",
+        header=None,
+        names=["user_id", "gender", "age", "occupation", "zip_code"],
+        usecols=["user_id", "gender", "age", "occupation"],
+        encoding="ISO-8859-1",
+    )
+    users_df["gender"] = (users_df["gender"] == "M").astype(np.int8)
+    users_df = users_df.astype(
+        {"user_id": np.int32, "age": np.int32, "occupation": np.int32}
+    )
+
+    movies_df = pd.read_csv(
+        movies_file,
+        sep="::",
+        engine="python",
+        header=None,
+        names=["movie_id", "title", "genres"],
+        usecols=["movie_id", "title"],
+        encoding="ISO-8859-1",
+    )
+    # release year is the trailing "(YYYY)" of the title, 0 if missing.
+    # int16 is enough for years (the year table has 2050 rows).
+    movies_df["year"] = (
+        movies_df["title"]
+        .str.extract(r"\((\d{4})\)$", expand=False)
+        .fillna(0)
+        .astype(np.int16)
+    )
+    movies_df = movies_df[["movie_id", "year"]].astype({"movie_id": np.int32})
 
-        users_df = pd.DataFrame(users_data)
+    data = pd.merge(ratings_df, users_df, on="user_id", how="left")
+    data = pd.merge(data, movies_df, on="movie_id", how="left")
 
-        movies_data = []
-        with open(movies_file, "r", encoding="ISO-8859-1") as f:
-            for line in f:
-                parts = line.strip().split("::")
-                movie_id = int(parts[0])
-                year = 0
-                if parts[1].endswith(")"):
-                    year_start = parts[1].rfind("(")
-                    if year_start != -1:
-                        year_str = parts[1][year_start + 1 : parts[1].rfind(")")]
-                        try:
-                            year = int(year_str)
-                        except ValueError:
-                            year = 0
+    data = data.sort_values("timestamp")
 
-                movies_data.append({"movie_id": movie_id, "year": year})
+    return data
 
-        movies_df = pd.DataFrame(movies_data)
 
-        data = pd.merge(ratings_df, users_df, on="user_id", how="left")
-        data = pd.merge(data, movies_df, on="movie_id", how="left")
+# the merged frame is cached as parquet so later runs skip parsing the .dat files.
+# Bump the version whenever parse_movielens changes its output.
+_CACHE_VERSION = 2
+_SOURCE_FILES = ("ratings.dat", "users.dat", "movies.dat")
+# no parquet engine installed (ImportError), or an engine built without zstd
+# (pyarrow raises ArrowNotImplementedError, a NotImplementedError).
+_PARQUET_ERRORS = (ImportError, NotImplementedError, ValueError)
 
-        data = data.sort_values("timestamp")
 
-        split_idx = int(len(data) * 0.8)
-        if split == "train":
-            self.data = data.iloc[:split_idx]
-        else:
-            self.data = data.iloc[split_idx:]
+def load_movielens(data_path: str) -> pd.DataFrame:
+    cache_file = os.path.join(data_path, f"ml1m_merged.v{_CACHE_VERSION}.parquet")
+    source_mtime = max(
+        os.path.getmtime(os.path.join(data_path, name)) for name in _SOURCE_FILES
+    )
+    # a cache older than any of its source files is stale.
+    if os.path.exists(cache_file) and os.path.getmtime(cache_file) >= source_mtime:
+        try:
+            return pd.read_parquet(cache_file)
+        except _PARQUET_ERRORS:
+            pass
+
+    data = parse_movielens(data_path)
+    # write to a private file then rename, so concurrent writers never expose a
+    # partially written cache.
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        data.to_parquet(tmp_file, compression="zstd")
+        os.replace(tmp_file, cache_file)
+    except _PARQUET_ERRORS:
+        # skip the cache.
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    return data
+
+
+# sparse features, in the order they are laid out in the KJT.
+_KEYS: Tuple[str, ...] = ("user_id", "movie_id", "gender", "age", "occupation", "year")
+_NUM_KEYS = len(_KEYS)
+
+
+class MovieLensDataset(Dataset):
+    def __init__(self, data_path: str):
+        data = load_movielens(data_path)
+
+        # ratings are sorted by time: the first 80% is used for training and
+        # the rest for testing, see train_view() and test_view().
+        self.split_idx = int(len(data) * 0.8)
+
+        # Keep each feature as a contiguous numpy column so that __getitem__
+        # does not touch pandas on the DataLoader hot path.
+        self.cols = {k: data[k].to_numpy(dtype=np.int64) for k in _KEYS}
+        self.labels = data["rating"].to_numpy(dtype=np.float32)
 
         self.max_user_id = data["user_id"].max()
         self.max_movie_id = data["movie_id"].max()
         self.max_age = data["age"].max()
         self.max_occupation = data["occupation"].max()
 
-        print(f": {len(self.data)} ")
+        print(f": {len(self.labels)} ")
         print(f": {self.max_user_id}, : {self.max_movie_id}")
 
     def __len__(self):
-        return len(self.data)
+        return len(self.labels)
 
     def __getitem__(self, idx):
-        row = self.data.iloc[idx]
-
-        sparse_features = {
-            "user_id": torch.tensor([row["user_id"]], dtype=torch.long),
-            "movie_id": torch.tensor([row["movie_id"]], dtype=torch.long),
-            "gender": torch.tensor([row["gender"]], dtype=torch.long),
-            "age": torch.tensor([row["age"]], dtype=torch.long),
-            "occupation": torch.tensor([row["occupation"]], dtype=torch.long),
-            "year": torch.tensor([row["year"]], dtype=torch.long),
-        }
+        sparse_features = {k: self.cols[k][idx] for k in self.cols}
+        return sparse_features, self.labels[idx]
 
-        label = torch.tensor(row["rating"], dtype=torch.float)
+    def train_view(self) -> Subset:
+        return Subset(self, range(0, self.split_idx))
 
-        return sparse_features, label
+    def test_view(self) -> Subset:
+        return Subset(self, range(self.split_idx, len(self)))
 
 
-def collate_fn(batch):
-    sparse_features = {
-        "user_id": [],
-        "movie_id": [],
-        "gender": [],
-        "age": [],
-        "occupation": [],
-        "year": [],
-    }
-
-    labels = []
+# lengths are all ones (hotness 1), so they only depend on the batch size.
+_LENGTHS_CACHE: Dict[int, torch.Tensor] = {}
 
-    for features, label in batch:
-        for key in sparse_features:
-            sparse_features[key].extend(features[key].tolist())
-        labels.append(label)
 
-    lengths = {
-        "user_id": torch.tensor([1] * len(batch), dtype=torch.long),
-        "movie_id": torch.tensor([1] * len(batch), dtype=torch.long),
-        "gender": torch.tensor([1] * len(batch), dtype=torch.long),
-        "age": torch.tensor([1] * len(batch), dtype=torch.long),
-        "occupation": torch.tensor([1] * len(batch), dtype=torch.long),
-        "year": torch.tensor([1] * len(batch), dtype=torch.long),
-    }
+def collate_fn(batch):
+    batch_size = len(batch)
+
+    # fill one preallocated buffer column by column instead of building a
+    # tensor per feature and concatenating them.
+    values = np.empty(_NUM_KEYS * batch_size, dtype=np.int64)
+    for i, k in enumerate(_KEYS):
+        values[i * batch_size : (i + 1) * batch_size] = np.fromiter(
+            (features[k] for features, _ in batch),
+            dtype=np.int64,
+            count=batch_size,
+        )
+    labels = torch.from_numpy(
+        np.fromiter((label for _, label in batch), dtype=np.float32, count=batch_size)
+    )
 
-    values = {
-        "user_id": torch.tensor(sparse_features["user_id"], dtype=torch.long),
-        "movie_id": torch.tensor(sparse_features["movie_id"], dtype=torch.long),
-        "gender": torch.tensor(sparse_features["gender"], dtype=torch.long),
-        "age": torch.tensor(sparse_features["age"], dtype=torch.long),
-        "occupation": torch.tensor(sparse_features["occupation"], dtype=torch.long),
-        "year": torch.tensor(sparse_features["year"], dtype=torch.long),
-    }
+    lengths = _LENGTHS_CACHE.get(batch_size)
+    if lengths is None:
+        lengths = torch.ones(_NUM_KEYS * batch_size, dtype=torch.long)
+        _LENGTHS_CACHE[batch_size] = lengths
 
     kjt = KeyedJaggedTensor(
-        keys=list(values.keys()),
-        values=torch.cat([values[k] for k in values.keys()]),
-        lengths=torch.cat([lengths[k] for k in lengths.keys()]),
+        keys=list(_KEYS),
+        values=torch.from_numpy(values),
+        lengths=lengths,
     )
 
-    return kjt, torch.tensor(labels, dtype=torch.float)
+    return kjt, labels
 
 
 class MovieLensModel(nn.Module):
@@ -292,17 +330,27 @@ class MovieLensModel(nn.Module):
         super().__init__()
         self.embedding_module = embedding_module
 
-        dense_arch_layers = []
-        for i in range(len(dense_arch_layer_sizes) - 1):
-            dense_arch_layers.append(
-                nn.Linear(dense_arch_layer_sizes[i], dense_arch_layer_sizes[i + 1])
-            )
-            dense_arch_layers.append(nn.ReLU())
-        self.dense_arch = nn.Sequential(*dense_arch_layers)
+        if dense_in_features == 0:
+            # no dense input, don't create parameters that are never used.
+            self.dense_arch = nn.Identity()
+        else:
+            dense_arch_layers = []
+            for i in range(len(dense_arch_layer_sizes) - 1):
+                dense_arch_layers.append(
+                    nn.Linear(dense_arch_layer_sizes[i], dense_arch_layer_sizes[i + 1])
+                )
+                dense_arch_layers.append(nn.ReLU())
+            self.dense_arch = nn.Sequential(*dense_arch_layers)
 
-        embedding_dim = embedding_module.embedding_configs()[0].embedding_dim
-        for config in embedding_module.embedding_configs():
+        embedding_configs = embedding_module.embedding_configs()
+        embedding_dim = embedding_configs[0].embedding_dim
+        for config in embedding_configs:
             assert embedding_dim == config.embedding_dim
+        self._num_features = len(embedding_configs)
+        self._feature_keys = tuple(
+            config.feature_names[0] for config in embedding_configs
+        )
+        self._get_embeddings = itemgetter(*self._feature_keys)
 
         over_arch_layers = []
         if dense_in_features == 0:
@@ -325,20 +373,32 @@ class MovieLensModel(nn.Module):
         over_arch_layers.append(nn.Linear(over_arch_layer_sizes[-1], 1))
         self.over_arch = nn.Sequential(*over_arch_layers)
 
+        # The sharded embedding module issues collectives and stays eager, only
+        # the dense tail after the lookup is compiled. The batch size is fixed
+        # by args, so the graph is specialized on static shapes (the last,
+        # smaller batch of an epoch compiles one extra graph).
+        self._compiled_head = torch.compile(
+            self._head, mode="reduce-overhead", dynamic=False, fullgraph=True
+        )
+
+    def _head(
+        self, sparse_features: torch.Tensor, num_features: int, batch: int
+    ) -> torch.Tensor:
+        # bf16 has the fp32 exponent range, so no grad scaler is needed.
+        with torch.autocast(device_type="cuda", dtype=torch.bfloat16):
+            prediction = self.over_arch(sparse_features).squeeze(-1)
+        # num_feature x batch_size (hotness is 1), reduce over features without
+        # transposing so the reduction stays contiguous.
+        return prediction.float().view(num_features, batch).sum(dim=0)
+
     def forward(self, kjt: KeyedJaggedTensor) -> torch.Tensor:
         embeddings = self.embedding_module(kjt)
 
         sparse_features = torch.cat(
-            [embeddings[k].values() for k in embeddings.keys()], dim=0
+            [jt.values() for jt in self._get_embeddings(embeddings)], dim=0
         )
 
-        prediction = self.over_arch(sparse_features)
-        num_features = len(kjt.keys())
-        batch = len(kjt.lengths()) // num_features
-        hotness = 1
-        # batch_size x hotness(1) x num_feature
-        x = prediction.view(hotness * num_features, batch)
-        return torch.sum(x.t(), dim=-1)
+        return self._compiled_head(sparse_features, self._num_features, kjt.stride())
 
 
 # use a function warp all the Planner code
@@ -436,14 +496,20 @@ def get_dynamicemb_dmp(ebc, args):
     fused_params["output_dtype"] = SparseType.FP32
     fused_params.update(optimizer_kwargs)
 
-    # precision of all-to-all
+    # precision of all-to-all, bf16 halves the bytes on the wire and keeps the
+    # fp32 exponent range.
+    comm_type = {
+        "fp32": CommType.FP32,
+        "bf16": CommType.BF16,
+        "fp16": CommType.FP16,
+    }[args.comm_dtype]
     qcomm_codecs_registry = (
         get_qcomm_codecs_registry(
             qcomms_config=QCommsConfig(
                 # pyre-ignore
-                forward_precision=CommType.FP32,
+                forward_precision=comm_type,
                 # pyre-ignore
-                backward_precision=CommType.FP32,
+                backward_precision=comm_type,
             )
         )
         if backend == "nccl"
@@ -534,112 +600,111 @@ def create_model(args):
     return model
 
 
+def prefetch_to_device(loader):
+    # Copy the next batch to the GPU on a side stream while the current batch
+    # is being computed, so the H2D transfer overlaps with compute.
+    copy_stream = torch.cuda.Stream()
+
+    def _copy(batch):
+        features, labels = batch
+        with torch.cuda.stream(copy_stream):
+            return (
+                features.to(device, non_blocking=True),
+                labels.to(device, non_blocking=True),
+            )
+
+    loader_iter = iter(loader)
+    batch = next(loader_iter, None)
+    next_batch = _copy(batch) if batch is not None else None
+    while next_batch is not None:
+        current_stream = torch.cuda.current_stream()
+        current_stream.wait_stream(copy_stream)
+        features, labels = next_batch
+        # tensors allocated on copy_stream are consumed on the current stream.
+        features.record_stream(current_stream)
+        labels.record_stream(current_stream)
+
+        batch = next(loader_iter, None)
+        next_batch = _copy(batch) if batch is not None else None
+        yield features, labels
+
+
 def train_one_epoch(model, train_loader, optimizer, loss_fn, epoch, total_epochs):
     model.train()
-    total_loss = 0
-
-    for batch_idx, (features, labels) in enumerate(train_loader):
-        features = features.to(device)
-        labels = labels.to(device)
+    # accumulate on device, calling .item() every step would sync the stream.
+    total_loss = torch.zeros((), device=device)
 
+    for batch_idx, (features, labels) in enumerate(prefetch_to_device(train_loader)):
         outputs = model(features)
         loss = loss_fn(outputs, labels)
 
-        optimizer.zero_grad()
+        optimizer.zero_grad(set_to_none=True)
         loss.backward()
         optimizer.step()
 
-        total_loss += loss.item()
+        total_loss += loss.detach()
 
         if batch_idx % 100 == 0:
             print(
                 f"Epoch {epoch+1}/{total_epochs}, Batch {batch_idx}/{len(train_loader)}, Loss: {loss.item():.4f}"
             )
 
-    avg_loss = total_loss / len(train_loader)
+    avg_loss = (total_loss / len(train_loader)).item()
     print(f"Epoch {epoch+1}/{total_epochs}, Average Loss: {avg_loss:.4f}")
 
 
 def test_one_epoch(model, test_loader, loss_fn, epoch, total_epochs):
     model.eval()
-    test_loss = 0
+    test_loss = torch.zeros((), device=device)
     with torch.no_grad():
-        for features, labels in test_loader:
-            features = features.to(device)
-            labels = labels.to(device)
-
+        for features, labels in prefetch_to_device(test_loader):
             outputs = model(features)
             loss = loss_fn(outputs, labels)
-            test_loss += loss.item()
+            test_loss += loss
 
-    avg_test_loss = test_loss / len(test_loader)
+    avg_test_loss = (test_loss / len(test_loader)).item()
     print(f"Epoch {epoch+1}/{total_epochs}, Test Loss: {avg_test_loss:.4f}")
 
 
-def train(args):
-    train_dataset = MovieLensDataset(args.data_path, split="train")
-    test_dataset = MovieLensDataset(args.data_path, split="test")
-    train_sampler = DistributedSampler(
-        train_dataset, num_replicas=world_size, rank=local_rank, shuffle=True
+def get_dataloader(dataset, batch_size, shuffle):
+    sampler = DistributedSampler(
+        dataset, num_replicas=world_size, rank=local_rank, shuffle=shuffle
     )
-    test_sampler = DistributedSampler(
-        test_dataset, num_replicas=world_size, rank=local_rank, shuffle=False
-    )
-
-    train_loader = DataLoader(
-        train_dataset,
-        batch_size=args.batch_size,
+    return DataLoader(
+        dataset,
+        batch_size=batch_size,
         shuffle=False,
         collate_fn=collate_fn,
         num_workers=4,
-        sampler=train_sampler,
+        persistent_workers=True,
+        pin_memory=True,
+        prefetch_factor=4,
+        sampler=sampler,
     )
 
-    test_loader = DataLoader(
-        test_dataset,
-        batch_size=args.batch_size,
-        shuffle=False,
-        collate_fn=collate_fn,
-        num_workers=4,
-        sampler=test_sampler,
-    )
 
+def create_model_and_optimizer(args):
     model = create_model(args)
     model.to(device)
-
     optimizer = Adam(model.parameters(), lr=args.lr)
-    criterion = nn.MSELoss()
+    return model, optimizer
+
+
+def train(args, criterion, train_loader, test_loader):
+    model, optimizer = create_model_and_optimizer(args)
 
     for epoch in range(args.epochs):
-        train_sampler.set_epoch(epoch)
+        train_loader.sampler.set_epoch(epoch)
         train_one_epoch(model, train_loader, optimizer, criterion, epoch, args.epochs)
         test_one_epoch(model, test_loader, criterion, epoch, args.epochs)
 
 
-def dump(args):
+def dump(args, criterion, train_loader):
     os.makedirs(args.save_dir, exist_ok=True)
-    train_dataset = MovieLensDataset(args.data_path, split="train")
-    train_sampler = DistributedSampler(
-        train_dataset, num_replicas=world_size, rank=local_rank, shuffle=True
-    )
-
-    train_loader = DataLoader(
-        train_dataset,
-        batch_size=args.batch_size,
-        shuffle=False,
-        collate_fn=collate_fn,
-        num_workers=4,
-        sampler=train_sampler,
-    )
-
-    model = create_model(args)
-    model.to(device)
-
-    optimizer = Adam(model.parameters(), lr=args.lr)
-    criterion = nn.MSELoss()
+    model, optimizer = create_model_and_optimizer(args)
 
     for epoch in range(args.epochs):
-        train_sampler.set_epoch(epoch)
+        train_loader.sampler.set_epoch(epoch)
         train_one_epoch(model, train_loader, optimizer, criterion, epoch, args.epochs)
 
         # ShardedDyanmicEmbeddingCollection.state_dict() will return a dummy tensor.
@@ -654,27 +719,10 @@ def dump(args):
     DynamicEmbDump(os.path.join(args.save_dir, "dynamicemb"), model, optim=True)
 
 
-def load(args):
+def load(args, criterion, test_loader):
     os.makedirs(args.save_dir, exist_ok=True)
-    test_dataset = MovieLensDataset(args.data_path, split="test")
-    test_sampler = DistributedSampler(
-        test_dataset, num_replicas=world_size, rank=local_rank, shuffle=False
-    )
-
-    test_loader = DataLoader(
-        test_dataset,
-        batch_size=args.batch_size,
-        shuffle=False,
-        collate_fn=collate_fn,
-        num_workers=4,
-        sampler=test_sampler,
-    )
-
-    model = create_model(args)
-    model.to(device)
-
-    optimizer = Adam(model.parameters(), lr=args.lr)
-    criterion = nn.MSELoss()
+    # a fresh model, so the test loss only reflects what was loaded back.
+    model, optimizer = create_model_and_optimizer(args)
 
     # load
     checkpoint = torch.load(
@@ -696,47 +744,28 @@ def load(args):
     dist.barrier(device_ids=[local_rank])
 
 
-def inc_dump(args):
+def inc_dump(args, criterion, train_loader):
     os.makedirs(args.save_dir, exist_ok=True)
-    train_dataset = MovieLensDataset(args.data_path, split="train")
-    train_sampler = DistributedSampler(
-        train_dataset, num_replicas=world_size, rank=local_rank, shuffle=True
-    )
-
-    train_loader = DataLoader(
-        train_dataset,
-        batch_size=args.batch_size,
-        shuffle=False,
-        collate_fn=collate_fn,
-        num_workers=4,
-        sampler=train_sampler,
-    )
-
-    model = create_model(args)
-    model.to(device)
-
-    optimizer = Adam(model.parameters(), lr=args.lr)
-    criterion = nn.MSELoss()
+    model, optimizer = create_model_and_optimizer(args)
 
     undumped_score = get_score(model)
 
     for epoch in range(args.epochs):
-        train_sampler.set_epoch(epoch)
+        train_loader.sampler.set_epoch(epoch)
         model.train()
-        total_loss = 0
-
-        for batch_idx, (features, labels) in enumerate(train_loader):
-            features = features.to(device)
-            labels = labels.to(device)
+        total_loss = torch.zeros((), device=device)
 
+        for batch_idx, (features, labels) in enumerate(
+            prefetch_to_device(train_loader)
+        ):
             outputs = model(features)
             loss = criterion(outputs, labels)
 
-            optimizer.zero_grad()
+            optimizer.zero_grad(set_to_none=True)
             loss.backward()
             optimizer.step()
 
-            total_loss += loss.item()
+            total_loss += loss.detach()
 
             if batch_idx % 100 == 0:
                 # reset undumped_score here.
@@ -754,25 +783,38 @@ def inc_dump(args):
                     f"Epoch {epoch+1}/{args.epochs}, Batch {batch_idx}/{len(train_loader)}, Loss: {loss.item():.4f}, dump number: {dump_number}"
                 )
 
-        avg_loss = total_loss / len(train_loader)
+        avg_loss = (total_loss / len(train_loader)).item()
         print(f"Epoch {epoch+1}/{args.epochs}, Average Loss: {avg_loss:.4f}")
 
 
 def main():
     args = parse_args()
-    torch.cuda.manual_seed(args.seed)
+    # seed the CPU generator as well, DataLoader workers derive their seeds from it.
+    torch.manual_seed(args.seed)
+    torch.cuda.manual_seed_all(args.seed)
     np.random.seed(args.seed)
     if local_rank == 0:
         download_movielens(args.data_path)
+        # build the parquet cache once so that the other ranks only read it.
+        load_movielens(args.data_path)
     dist.barrier(device_ids=[local_rank])
+
+    # the dataset and loaders are shared by all modes, so the files are parsed
+    # and the workers started once per run. Each mode still builds its own
+    # model and optimizer: load must not see the tables that dump left behind.
+    dataset = MovieLensDataset(args.data_path)
+    train_loader = get_dataloader(dataset.train_view(), args.batch_size, shuffle=True)
+    test_loader = get_dataloader(dataset.test_view(), args.batch_size, shuffle=False)
+    criterion = nn.MSELoss()
+
     if args.train:
-        train(args)
+        train(args, criterion, train_loader, test_loader)
     if args.dump:
-        dump(args)
+        dump(args, criterion, train_loader)
     if args.load:
-        load(args)
+        load(args, criterion, test_loader)
     if args.incremental_dump:
-        inc_dump(args)
+        inc_dump(args, criterion, train_loader)
 
 
 if __name__ == "__main__":
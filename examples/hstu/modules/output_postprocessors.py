@@ -27,19 +27,234 @@
 # limitations under the License.
 
 import abc
+import collections
+import functools
+import os
+from typing import Any, Callable, Optional, OrderedDict, Tuple, Union
 
 import torch
 import torch.nn.functional as F
+from configs import KernelBackend
+from ops.triton_ops.triton_l2_norm import (
+    INT8_QMAX,
+    l2_norm_quant_scale,
+    triton_l2_norm,
+    triton_l2_norm_quantized,
+)
+from ops.triton_ops.triton_layer_norm import triton_layer_norm
+
+
+@functools.lru_cache(maxsize=None)
+def _maybe_compile(
+    fn: Callable[..., torch.Tensor], *args: Any
+) -> Callable[[torch.Tensor], torch.Tensor]:
+    """
+    Returns x -> fn(x, *args), compiled on first use so that slice, reduction
+    and normalization fuse into one kernel. args (embedding_dim, eps, ...) are
+    closure constants rather than graph inputs, so the compiler specializes on
+    them, and each configuration gets its own cached function. The closure
+    holds no module reference. Set HSTU_DISABLE_COMPILE=1 to run it eagerly,
+    e.g. for CPU-only tests without a compiler toolchain.
+    """
+
+    def normalize(x: torch.Tensor) -> torch.Tensor:
+        return fn(x, *args)
+
+    if os.environ.get("HSTU_DISABLE_COMPILE", "0") == "1":
+        return normalize
+    return torch.compile(normalize, dynamic=True)
+
+
+def _check_compute_dtype(
+    compute_dtype: Optional[torch.dtype],
+    kernel_backend: KernelBackend,
+) -> Optional[torch.dtype]:
+    if compute_dtype is not None and kernel_backend == KernelBackend.TRITON:
+        raise ValueError(
+            "compute_dtype is only supported with KernelBackend.PYTORCH, the triton "
+            "kernels compute in the input dtype"
+        )
+    if compute_dtype == torch.bfloat16 and not (
+        torch.cuda.is_available() and torch.cuda.is_bf16_supported()
+    ):
+        return None
+    return compute_dtype
+
+
+def _check_output_dtype(output_dtype: Optional[torch.dtype]) -> None:
+    if output_dtype is None or output_dtype == torch.int8:
+        return
+    if output_dtype != torch.float8_e4m3fn:
+        raise ValueError(
+            f"output_dtype must be None, torch.int8 or torch.float8_e4m3fn, "
+            f"got {output_dtype}"
+        )
+    # e4m3 conversion is native from sm89 (Ada/Hopper) on.
+    if not (torch.cuda.is_available() and torch.cuda.get_device_capability() >= (8, 9)):
+        raise ValueError("float8_e4m3fn output requires a CUDA device with sm89+")
+
+
+def _round_half_away_from_zero(x: torch.Tensor) -> torch.Tensor:
+    # matches the rounding of the triton l2 norm kernel, unlike torch.round,
+    # which rounds half to even.
+    return (x + 0.5 * torch.sign(x)).trunc()
+
+
+def _quantize_rowwise(
+    x: torch.Tensor, output_dtype: torch.dtype
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Symmetric per-row absmax quantization. Returns (x_q, scale) with scale of
+    shape [..., 1], so that x_q.float() * scale ~= x.
+    """
+    qmax = INT8_QMAX if output_dtype == torch.int8 else torch.finfo(output_dtype).max
+    x = x.float()
+    scale = x.abs().amax(dim=-1, keepdim=True).clamp_min(1e-12) / qmax
+    x_q = x / scale
+    if output_dtype == torch.int8:
+        x_q = _round_half_away_from_zero(x_q)
+    return x_q.to(output_dtype), scale
+
+
+def _l2_norm(
+    output_embeddings: torch.Tensor,
+    embedding_dim: int,
+    eps_sq: float,
+    compute_dtype: Optional[torch.dtype],
+) -> torch.Tensor:
+    if output_embeddings.size(-1) != embedding_dim:
+        output_embeddings = output_embeddings.narrow(-1, 0, embedding_dim)
+    x = output_embeddings
+    # half-precision inputs already compute in their own dtype.
+    if compute_dtype is not None and x.is_cuda and x.dtype == torch.float32:
+        x = x.to(compute_dtype)
+    # x / max(||x||, eps) == x * rsqrt(max(||x||^2, eps^2))
+    # keep the norm in fp32: eps^2 underflows in fp16 and 1 / eps overflows it.
+    # Square in fp32 too: fp16 squares overflow for |x| > 256 when run eagerly.
+    xf = x.float()
+    sum_sq = (xf * xf).sum(dim=-1, keepdim=True)
+    inv_norm = torch.rsqrt(sum_sq.clamp_min(eps_sq))
+    return (x * inv_norm).to(output_embeddings.dtype)
+
+
+def _layer_norm(
+    output_embeddings: torch.Tensor,
+    normalized_shape: Tuple[int],
+    eps: float,
+    compute_dtype: Optional[torch.dtype],
+) -> torch.Tensor:
+    if output_embeddings.size(-1) != normalized_shape[0]:
+        output_embeddings = output_embeddings.narrow(-1, 0, normalized_shape[0])
+    x = output_embeddings
+    # half-precision inputs already compute in their own dtype.
+    if compute_dtype is not None and x.is_cuda and x.dtype == torch.float32:
+        x = x.to(compute_dtype)
+    y = F.layer_norm(x, normalized_shape, eps=eps)
+    return y.to(output_embeddings.dtype)
+
+
+# (out_q, scale) when an output_dtype is set.
+PostprocessorOutput = Union[torch.Tensor, Tuple[torch.Tensor, torch.Tensor]]
 
 
 class OutputPostprocessorModule(torch.nn.Module):
-    """"""
+    """
+    Args:
+        use_cuda_graph: if True, inference calls (grad disabled) on CUDA inputs
+            are replayed from a captured CUDA graph, which collapses the kernel
+            launches of the postprocessor into one. The number of rows is
+            padded to the next power of two, so jagged batches share graphs,
+            and at most max_cuda_graphs graphs are kept (least recently used
+            first out). Each cached graph keeps its padded input and output
+            alive in a memory pool shared by the module's graphs, so the cache
+            can hold up to max_cuda_graphs times the input plus output of the
+            largest padded batch.
+        max_cuda_graphs: capacity of the CUDA graph cache.
+        output_dtype: if torch.int8 or torch.float8_e4m3fn, forward returns
+            the quantized output and its float32 scale as (out_q, scale),
+            with out_q.float() * scale ~= the unquantized output. Intended for
+            inference consumers such as ANN indexes; it is not differentiable.
+            float8_e4m3fn requires sm89+.
+    """
+
+    def __init__(
+        self,
+        use_cuda_graph: bool = False,
+        output_dtype: Optional[torch.dtype] = None,
+        max_cuda_graphs: int = 8,
+    ) -> None:
+        super().__init__()
+        _check_output_dtype(output_dtype)
+        self._use_cuda_graph: bool = use_cuda_graph
+        self._output_dtype: Optional[torch.dtype] = output_dtype
+        self._max_cuda_graphs: int = max_cuda_graphs
+        self._graph_cache: OrderedDict[
+            Tuple[int, int, torch.dtype, torch.device],
+            Tuple[torch.cuda.CUDAGraph, torch.Tensor, PostprocessorOutput],
+        ] = collections.OrderedDict()
+        # the (id, id) handle returned by torch.cuda.graph_pool_handle().
+        self._graph_pool: Optional[Tuple[int, int]] = None
+
+    def _maybe_graphed(
+        self,
+        fn: Callable[[torch.Tensor], PostprocessorOutput],
+        x: torch.Tensor,
+    ) -> PostprocessorOutput:
+        if (
+            not self._use_cuda_graph
+            or not x.is_cuda
+            or torch.is_grad_enabled()
+            or torch.cuda.is_current_stream_capturing()
+        ):
+            return fn(x)
+
+        # every postprocessor is row-wise, so rows are padded up to a power of
+        # two bucket and the padding rows of the output are dropped.
+        shape = x.shape
+        x = x.reshape(-1, shape[-1])
+        num_rows = x.size(0)
+        bucket = 1 << max(num_rows - 1, 0).bit_length()
+        key = (bucket, x.size(1), x.dtype, x.device)
+        if key in self._graph_cache:
+            self._graph_cache.move_to_end(key)
+        else:
+            if len(self._graph_cache) >= self._max_cuda_graphs:
+                self._graph_cache.popitem(last=False)
+            if self._graph_pool is None:
+                # all shapes share one memory pool.
+                self._graph_pool = torch.cuda.graph_pool_handle()
+            static_in = x.new_zeros((bucket, x.size(1)))
+            # warm up on a side stream so that lazy init (triton autotune,
+            # compilation) happens outside the capture.
+            side_stream = torch.cuda.Stream()
+            side_stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(side_stream):
+                fn(static_in)
+            torch.cuda.current_stream().wait_stream(side_stream)
+            graph = torch.cuda.CUDAGraph()
+            with torch.cuda.graph(graph, pool=self._graph_pool):
+                static_out = fn(static_in)
+            self._graph_cache[key] = (graph, static_in, static_out)
+
+        graph, static_in, static_out = self._graph_cache[key]
+        static_in[:num_rows].copy_(x, non_blocking=True)
+        graph.replay()
+
+        def _unpad(t: torch.Tensor) -> torch.Tensor:
+            # the next replay overwrites static_out, so the rows are copied.
+            if t.dim() == 0:
+                return t.clone()
+            return t[:num_rows].clone().view(shape[:-1] + t.shape[-1:])
+
+        if isinstance(static_out, tuple):
+            return (_unpad(static_out[0]), _unpad(static_out[1]))
+        return _unpad(static_out)
 
     @abc.abstractmethod
     def forward(
         self,
         output_embeddings: torch.Tensor,
-    ) -> torch.Tensor:
+    ) -> PostprocessorOutput:
         """"""
 
 
@@ -48,39 +263,144 @@ class L2NormEmbeddingPostprocessor(OutputPostprocessorModule):
         self,
         embedding_dim: int,
         eps: float = 1e-6,
+        kernel_backend: KernelBackend = KernelBackend.TRITON,
+        compute_dtype: Optional[torch.dtype] = None,
+        use_cuda_graph: bool = False,
+        output_dtype: Optional[torch.dtype] = None,
+        max_cuda_graphs: int = 8,
     ) -> None:
-        super().__init__()
+        """
+        Args:
+            compute_dtype: if set, fp32 CUDA inputs are cast to this dtype for
+                the normalization and the output is cast back, so the IO dtype
+                is unchanged. Half-precision inputs are not cast. Requires
+                KernelBackend.PYTORCH.
+            output_dtype: see OutputPostprocessorModule. The normalized output
+                lies in [-1, 1], so it is quantized with one static scale (1/127
+                for int8, 1.0 for fp8) returned as a 0-dim tensor; the triton
+                kernel writes the quantized values directly.
+        """
+        super().__init__(use_cuda_graph, output_dtype, max_cuda_graphs)
         self._embedding_dim: int = embedding_dim
         self._eps: float = eps
+        # a python float: the clamp takes it as a kernel scalar, compile and CUDA
+        # graphs treat it as a constant, and Module.half() cannot underflow it.
+        self._eps_sq: float = eps * eps
+        self._kernel_backend: KernelBackend = kernel_backend
+        self._compute_dtype: Optional[torch.dtype] = _check_compute_dtype(
+            compute_dtype, kernel_backend
+        )
 
-    def forward(
+    def _forward_impl(
+        self,
+        output_embeddings: torch.Tensor,
+    ) -> torch.Tensor:
+        return _maybe_compile(
+            _l2_norm, self._embedding_dim, self._eps_sq, self._compute_dtype
+        )(output_embeddings)
+
+    def _normalize(
         self,
         output_embeddings: torch.Tensor,
     ) -> torch.Tensor:
-        output_embeddings = output_embeddings[..., : self._embedding_dim]
-        return output_embeddings / torch.clamp(
-            torch.linalg.norm(output_embeddings, ord=None, dim=-1, keepdim=True),
-            min=self._eps,
+        if self._kernel_backend == KernelBackend.TRITON and output_embeddings.is_cuda:
+            return triton_l2_norm(output_embeddings, self._embedding_dim, self._eps)
+        return self._forward_impl(output_embeddings)
+
+    def _normalize_quantized(
+        self,
+        output_embeddings: torch.Tensor,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        assert self._output_dtype is not None
+        if self._kernel_backend == KernelBackend.TRITON and output_embeddings.is_cuda:
+            return triton_l2_norm_quantized(
+                output_embeddings, self._embedding_dim, self._eps, self._output_dtype
+            )
+        scale = l2_norm_quant_scale(self._output_dtype)
+        y = self._forward_impl(output_embeddings).float() * (1.0 / scale)
+        if self._output_dtype == torch.int8:
+            y = _round_half_away_from_zero(y)
+        return y.to(self._output_dtype), torch.full(
+            (), scale, dtype=torch.float32, device=y.device
         )
 
+    def forward(
+        self,
+        output_embeddings: torch.Tensor,
+    ) -> PostprocessorOutput:
+        if self._output_dtype is not None:
+            return self._maybe_graphed(self._normalize_quantized, output_embeddings)
+        return self._maybe_graphed(self._normalize, output_embeddings)
+
 
 class LayerNormEmbeddingPostprocessor(OutputPostprocessorModule):
     def __init__(
         self,
         embedding_dim: int,
         eps: float = 1e-6,
+        kernel_backend: KernelBackend = KernelBackend.TRITON,
+        compute_dtype: Optional[torch.dtype] = None,
+        use_cuda_graph: bool = False,
+        output_dtype: Optional[torch.dtype] = None,
+        max_cuda_graphs: int = 8,
     ) -> None:
-        super().__init__()
+        """
+        Args:
+            compute_dtype: if set, fp32 CUDA inputs are cast to this dtype for
+                the normalization and the output is cast back, so the IO dtype
+                is unchanged. Half-precision inputs are not cast. F.layer_norm
+                still accumulates in fp32. Requires KernelBackend.PYTORCH.
+            output_dtype: see OutputPostprocessorModule. The output is not
+                bounded, so the scale is the per-row absmax, of shape [..., 1].
+        """
+        super().__init__(use_cuda_graph, output_dtype, max_cuda_graphs)
         self._embedding_dim: int = embedding_dim
+        self._normalized_shape: Tuple[int] = (embedding_dim,)
         self._eps: float = eps
+        self._kernel_backend: KernelBackend = kernel_backend
+        self._compute_dtype: Optional[torch.dtype] = _check_compute_dtype(
+            compute_dtype, kernel_backend
+        )
 
-    def forward(
+    def _forward_impl(
         self,
         output_embeddings: torch.Tensor,
     ) -> torch.Tensor:
-        output_embeddings = output_embeddings[..., : self._embedding_dim]
-        return F.layer_norm(
-            output_embeddings,
-            normalized_shape=(self._embedding_dim,),
-            eps=self._eps,
-        )
+        return _maybe_compile(
+            _layer_norm, self._normalized_shape, self._eps, self._compute_dtype
+        )(output_embeddings)
+
+    def _normalize(
+        self,
+        output_embeddings: torch.Tensor,
+    ) -> torch.Tensor:
+        if self._kernel_backend == KernelBackend.TRITON and output_embeddings.is_cuda:
+            # one program per row computes mean, rstd and the normalized output.
+            # Flatten at full width first, so that the column slice of the 2D
+            # view is read in place through its row stride instead of copied.
+            shape = output_embeddings.shape
+            x = output_embeddings.reshape(-1, shape[-1])
+            if x.size(-1) != self._embedding_dim:
+                x = x.narrow(-1, 0, self._embedding_dim)
+            return triton_layer_norm(
+                x,
+                weight=None,
+                bias=None,
+                eps=self._eps,
+            ).view(shape[:-1] + (self._embedding_dim,))
+        return self._forward_impl(output_embeddings)
+
+    def _normalize_quantized(
+        self,
+        output_embeddings: torch.Tensor,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        assert self._output_dtype is not None
+        return _quantize_rowwise(self._normalize(output_embeddings), self._output_dtype)
+
+    def forward(
+        self,
+        output_embeddings: torch.Tensor,
+    ) -> PostprocessorOutput:
+        if self._output_dtype is not None:
+            return self._maybe_graphed(self._normalize_quantized, output_embeddings)
+        return self._maybe_graphed(self._normalize, output_embeddings)
@@ -0,0 +1,256 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from typing import Optional, Tuple
+
+import torch
+import triton
+import triton.language as tl
+from ops.triton_ops.common import switch_to_contiguous_if_needed
+
+
+# D is a constexpr: embedding_dim is fixed per model, so each value gets its
+# own specialized kernel (the mask folds away when D == BLOCK_D) and triton's
+# JIT cache shares it between all layers with the same D.
+@triton.jit
+def _l2_norm_fwd(
+    X,
+    Y,
+    eps_sq,
+    out_scale,
+    stride_x,
+    stride_y,
+    D: tl.constexpr,
+    BLOCK_D: tl.constexpr,
+    ROUND: tl.constexpr,
+):
+    row = tl.program_id(0)
+    X += row.to(tl.int64) * stride_x
+    Y += row.to(tl.int64) * stride_y
+    cols = tl.arange(0, BLOCK_D)
+    mask = cols < D
+    x = tl.load(X + cols, mask=mask, other=0.0).to(tl.float32)
+
+    # x / max(||x||, eps) == x * rsqrt(max(||x||^2, eps^2))
+    rnorm = tl.rsqrt(tl.maximum(tl.sum(x * x, axis=0), eps_sq))
+    # out_scale folds the quantization scale of an int8/fp8 output into the
+    # same multiply; the casting store truncates, so int8 is rounded first.
+    y = x * (rnorm * out_scale)
+    if ROUND:
+        y = tl.where(y >= 0, y + 0.5, y - 0.5)
+    tl.store(Y + cols, y.to(Y.dtype.element_ty), mask=mask)
+
+
+@triton.jit
+def _l2_norm_bwd(
+    DX,
+    DY,
+    X,
+    eps_sq,
+    stride_dx,
+    stride_dy,
+    stride_x,
+    D: tl.constexpr,
+    BLOCK_D: tl.constexpr,
+):
+    row = tl.program_id(0)
+    X += row.to(tl.int64) * stride_x
+    DY += row.to(tl.int64) * stride_dy
+    DX += row.to(tl.int64) * stride_dx
+    cols = tl.arange(0, BLOCK_D)
+    mask = cols < D
+    x = tl.load(X + cols, mask=mask, other=0.0).to(tl.float32)
+    dy = tl.load(DY + cols, mask=mask, other=0.0).to(tl.float32)
+
+    sum_sq = tl.sum(x * x, axis=0)
+    rnorm = tl.rsqrt(tl.maximum(sum_sq, eps_sq))
+    y = x * rnorm
+    # when the norm is clamped to eps the denominator is a constant, so the
+    # projection term vanishes and dx = dy / eps.
+    c = tl.where(sum_sq > eps_sq, tl.sum(dy * y, axis=0), 0.0)
+    dx = (dy - y * c) * rnorm
+    tl.store(DX + cols, dx.to(DX.dtype.element_ty), mask=mask)
+
+
+def _get_block_d_and_num_warps(x: torch.Tensor) -> Tuple[int, int]:
+    D = x.shape[-1]
+    # Less than 64KB per feature: enqueue fused kernel
+    MAX_FUSED_SIZE = 65536 // x.element_size()
+    BLOCK_D = min(MAX_FUSED_SIZE, triton.next_power_of_2(D))
+    if D > BLOCK_D:
+        raise RuntimeError("This l2 norm doesn't support feature dim >= 64KB.")
+    num_warps = min(max(BLOCK_D // 256, 1), 8)
+    return BLOCK_D, num_warps
+
+
+def triton_l2_norm_fwd(
+    x: torch.Tensor,
+    eps: float,
+    out_dtype: Optional[torch.dtype] = None,
+    out_scale: float = 1.0,
+) -> torch.Tensor:
+    assert x.dim() == 2, f"x.dim() == {x.dim()}, expected 2"
+    # a column slice of a wider tensor keeps stride(-1) == 1, so it is read in
+    # place through the row stride without being materialized.
+    x = switch_to_contiguous_if_needed(x)
+    N, D = x.shape
+    y = torch.empty((N, D), dtype=out_dtype or x.dtype, device=x.device)
+    if N == 0:
+        return y
+    BLOCK_D, num_warps = _get_block_d_and_num_warps(x)
+    # pyre-ignore[28]
+    _l2_norm_fwd[(N,)](
+        x,
+        y,
+        eps * eps,
+        out_scale,
+        x.stride(0),
+        y.stride(0),
+        D=D,
+        BLOCK_D=BLOCK_D,
+        ROUND=not y.dtype.is_floating_point,
+        num_warps=num_warps,
+    )
+    return y
+
+
+def triton_l2_norm_bwd(
+    dy: torch.Tensor,
+    x: torch.Tensor,
+    eps: float,
+    dx: Optional[torch.Tensor] = None,
+) -> torch.Tensor:
+    x = switch_to_contiguous_if_needed(x)
+    dy = switch_to_contiguous_if_needed(dy)
+    N, D = x.shape
+    if dx is None:
+        dx = torch.empty((N, D), dtype=x.dtype, device=x.device)
+    assert dx.stride(-1) == 1
+    if N == 0:
+        return dx
+    BLOCK_D, num_warps = _get_block_d_and_num_warps(x)
+    # pyre-ignore[28]
+    _l2_norm_bwd[(N,)](
+        dx,
+        dy,
+        x,
+        eps * eps,
+        dx.stride(0),
+        dy.stride(0),
+        x.stride(0),
+        D=D,
+        BLOCK_D=BLOCK_D,
+        num_warps=num_warps,
+    )
+    return dx
+
+
+@torch.library.custom_op("hstu::l2_norm_trimmed", mutates_args=())
+def l2_norm_trimmed(x: torch.Tensor, D: int, eps: float) -> torch.Tensor:
+    """
+    L2 norm over the first D columns of a 2D tensor. The columns are read
+    through the row stride of x, so the trimmed view is never materialized.
+    """
+    return triton_l2_norm_fwd(x.narrow(-1, 0, D), eps)
+
+
+@l2_norm_trimmed.register_fake
+def _(x: torch.Tensor, D: int, eps: float) -> torch.Tensor:
+    return x.new_empty(x.shape[:-1] + (D,))
+
+
+@torch.library.custom_op("hstu::l2_norm_trimmed_bwd", mutates_args=())
+def l2_norm_trimmed_bwd(
+    dy: torch.Tensor, x: torch.Tensor, D: int, eps: float
+) -> torch.Tensor:
+    # dx has the full width of x: the trimmed columns get no gradient. It is
+    # allocated row-major, since empty_like would keep the strides of a
+    # transposed x and the kernel writes rows with unit column stride.
+    dx = torch.empty(x.shape, dtype=x.dtype, device=x.device)
+    dx.narrow(-1, D, x.size(-1) - D).zero_()
+    triton_l2_norm_bwd(dy, x.narrow(-1, 0, D), eps, dx=dx.narrow(-1, 0, D))
+    return dx
+
+
+@l2_norm_trimmed_bwd.register_fake
+def _(dy: torch.Tensor, x: torch.Tensor, D: int, eps: float) -> torch.Tensor:
+    return torch.empty(x.shape, dtype=x.dtype, device=x.device)
+
+
+def _l2_norm_trimmed_setup_context(ctx, inputs, output) -> None:
+    x, D, eps = inputs
+    ctx.save_for_backward(x)
+    ctx.D = D
+    ctx.eps = eps
+
+
+def _l2_norm_trimmed_backward(ctx, dy: torch.Tensor) -> Tuple[torch.Tensor, None, None]:
+    (x,) = ctx.saved_tensors
+    return l2_norm_trimmed_bwd(dy, x, ctx.D, ctx.eps), None, None
+
+
+l2_norm_trimmed.register_autograd(
+    _l2_norm_trimmed_backward, setup_context=_l2_norm_trimmed_setup_context
+)
+
+
+@torch.fx.wrap
+def triton_l2_norm(x: torch.Tensor, D: int, eps: float) -> torch.Tensor:
+    """
+    Computes x[..., :D] / max(||x[..., :D]||_2, eps) in a single kernel,
+    without materializing the [..., :D] slice.
+    """
+    shape = x.shape
+    y = l2_norm_trimmed(x.reshape(-1, shape[-1]), D, eps)
+    return y.view(shape[:-1] + (D,))
+
+
+# symmetric int8 uses [-127, 127].
+INT8_QMAX = 127.0
+
+
+def l2_norm_quant_scale(out_dtype: torch.dtype) -> float:
+    """
+    Dequantization scale of an L2-normalized output stored as out_dtype. Every
+    normalized value lies in [-1, 1], so one static scale is exact for the
+    whole tensor: 1/127 for int8 and 1.0 for float8_e4m3fn.
+    """
+    if out_dtype == torch.int8:
+        return 1.0 / INT8_QMAX
+    if out_dtype == torch.float8_e4m3fn:
+        return 1.0
+    raise ValueError(f"Unsupported quantized output dtype {out_dtype}")
+
+
+@torch.fx.wrap
+def triton_l2_norm_quantized(
+    x: torch.Tensor, D: int, eps: float, out_dtype: torch.dtype
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Inference-only variant of triton_l2_norm that stores the output directly as
+    int8 (rounded half away from zero) or float8_e4m3fn, with the static scale
+    of l2_norm_quant_scale. Returns (y_q, scale) with
+    y_q.float() * scale ~= triton_l2_norm(x, D, eps).
+    """
+    scale = l2_norm_quant_scale(out_dtype)
+    shape = x.shape
+    y = triton_l2_norm_fwd(
+        x.reshape(-1, shape[-1]).narrow(-1, 0, D),
+        eps,
+        out_dtype=out_dtype,
+        out_scale=1.0 / scale,
+    )
+    return y.view(shape[:-1] + (D,)), torch.full(
+        (), scale, dtype=torch.float32, device=x.device
+    )
@@ -0,0 +1,186 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+import torch
+from configs import KernelBackend
+from modules.output_postprocessors import (
+    L2NormEmbeddingPostprocessor,
+    LayerNormEmbeddingPostprocessor,
+)
+
+
+@pytest.mark.parametrize("dtype", [torch.bfloat16, torch.float32])
+@pytest.mark.parametrize("batch_size", [0, 128, 1000])
+@pytest.mark.parametrize("embedding_dim,input_dim", [(128, 128), (64, 96), (256, 512)])
+@pytest.mark.parametrize("transposed", [False, True])
+def test_l2_norm_postprocessor(dtype, batch_size, embedding_dim, input_dim, transposed):
+    eps = 1e-6
+    if transposed:
+        # column-major input: the kernels need a contiguous copy and dx must
+        # still be allocated row-major.
+        x = torch.empty(input_dim, batch_size, device="cuda", dtype=dtype).t()
+    else:
+        x = torch.empty(batch_size, input_dim, device="cuda", dtype=dtype)
+    x = x.uniform_(-1, 1).requires_grad_(True)
+    # rows below eps exercise the clamped branch.
+    with torch.no_grad():
+        x[::7] *= 1e-8
+    ref_x = x.detach().clone().requires_grad_(True)
+
+    ref_norm = L2NormEmbeddingPostprocessor(
+        embedding_dim, eps=eps, kernel_backend=KernelBackend.PYTORCH
+    )
+    norm = L2NormEmbeddingPostprocessor(
+        embedding_dim, eps=eps, kernel_backend=KernelBackend.TRITON
+    )
+
+    ref_y = ref_norm(ref_x.float()).to(dtype)
+    y = norm(x)
+    torch.testing.assert_close(y, ref_y)
+
+    dout = torch.empty_like(y).uniform_(-0.1, 0.1)
+    ref_y.backward(dout)
+    y.backward(dout)
+    torch.testing.assert_close(x.grad, ref_x.grad)
+
+
+@pytest.mark.parametrize("dtype", [torch.bfloat16, torch.float32])
+@pytest.mark.parametrize("batch_size", [0, 128, 1000])
+@pytest.mark.parametrize("embedding_dim,input_dim", [(128, 128), (64, 96), (256, 512)])
+def test_layer_norm_postprocessor(dtype, batch_size, embedding_dim, input_dim):
+    eps = 1e-6
+    x = (
+        torch.empty(batch_size, input_dim, device="cuda", dtype=dtype)
+        .uniform_(-1, 1)
+        .requires_grad_(True)
+    )
+    ref_x = x.detach().clone().requires_grad_(True)
+
+    ref_norm = LayerNormEmbeddingPostprocessor(
+        embedding_dim, eps=eps, kernel_backend=KernelBackend.PYTORCH
+    )
+    norm = LayerNormEmbeddingPostprocessor(
+        embedding_dim, eps=eps, kernel_backend=KernelBackend.TRITON
+    )
+
+    ref_y = ref_norm(ref_x.float()).to(dtype)
+    y = norm(x)
+    torch.testing.assert_close(y, ref_y)
+
+    dout = torch.empty_like(y).uniform_(-0.1, 0.1)
+    ref_y.backward(dout)
+    y.backward(dout)
+    torch.testing.assert_close(x.grad, ref_x.grad)
+
+
+@pytest.mark.parametrize(
+    "postprocessor_cls", [L2NormEmbeddingPostprocessor, LayerNormEmbeddingPostprocessor]
+)
+@pytest.mark.parametrize(
+    "kernel_backend", [KernelBackend.TRITON, KernelBackend.PYTORCH]
+)
+def test_postprocessor_cuda_graph(postprocessor_cls, kernel_backend):
+    embedding_dim = 128
+    ref_norm = postprocessor_cls(embedding_dim, kernel_backend=kernel_backend).cuda()
+    norm = postprocessor_cls(
+        embedding_dim,
+        kernel_backend=kernel_backend,
+        use_cuda_graph=True,
+        max_cuda_graphs=2,
+    ).cuda()
+    with torch.no_grad():
+        # 64/50 and 1000/600 share a padded bucket; 3 evicts the oldest graph.
+        for batch_size in [64, 1000, 50, 600, 3, 64, 0, 1000]:
+            x = torch.randn(batch_size, 2 * embedding_dim, device="cuda")
+            torch.testing.assert_close(norm(x), ref_norm(x))
+            assert len(norm._graph_cache) <= 2
+
+
+@pytest.mark.parametrize(
+    "postprocessor_cls", [L2NormEmbeddingPostprocessor, LayerNormEmbeddingPostprocessor]
+)
+@pytest.mark.parametrize(
+    "kernel_backend", [KernelBackend.TRITON, KernelBackend.PYTORCH]
+)
+@pytest.mark.parametrize("output_dtype", [torch.int8, torch.float8_e4m3fn])
+@pytest.mark.parametrize("batch_size", [0, 1000])
+def test_postprocessor_quantized_output(
+    postprocessor_cls, kernel_backend, output_dtype, batch_size
+):
+    if (
+        output_dtype == torch.float8_e4m3fn
+        and torch.cuda.get_device_capability() < (8, 9)
+    ):
+        pytest.skip("float8_e4m3fn output requires sm89+")
+    embedding_dim = 128
+    ref_norm = postprocessor_cls(embedding_dim, kernel_backend=kernel_backend)
+    norm = postprocessor_cls(
+        embedding_dim, kernel_backend=kernel_backend, output_dtype=output_dtype
+    )
+    x = torch.randn(batch_size, 2 * embedding_dim, device="cuda")
+    with torch.no_grad():
+        ref_y = ref_norm(x)
+        y_q, scale = norm(x)
+    assert y_q.dtype == output_dtype
+    assert y_q.shape == ref_y.shape
+    y = y_q.float() * scale
+    if output_dtype == torch.int8:
+        # rounding is within half a quantization step.
+        assert torch.all((y - ref_y).abs() <= scale * 0.5 + 1e-6)
+    else:
+        # e4m3 keeps a 3-bit mantissa.
+        torch.testing.assert_close(y, ref_y, atol=1e-3, rtol=2**-4)
+
+
+@pytest.mark.parametrize(
+    "postprocessor_cls", [L2NormEmbeddingPostprocessor, LayerNormEmbeddingPostprocessor]
+)
+@pytest.mark.parametrize("compute_dtype", [torch.bfloat16, torch.float16])
+def test_postprocessor_compute_dtype(postprocessor_cls, compute_dtype):
+    if compute_dtype == torch.bfloat16 and not torch.cuda.is_bf16_supported():
+        pytest.skip("bfloat16 is not supported on this device")
+    embedding_dim = 128
+    with pytest.raises(ValueError):
+        postprocessor_cls(
+            embedding_dim,
+            kernel_backend=KernelBackend.TRITON,
+            compute_dtype=compute_dtype,
+        )
+    ref_norm = postprocessor_cls(embedding_dim, kernel_backend=KernelBackend.PYTORCH)
+    norm = postprocessor_cls(
+        embedding_dim, kernel_backend=KernelBackend.PYTORCH, compute_dtype=compute_dtype
+    )
+    x = torch.randn(1000, 2 * embedding_dim, device="cuda")
+    y = norm(x)
+    assert y.dtype == x.dtype
+    torch.testing.assert_close(y, ref_norm(x), atol=1e-2, rtol=1e-2)
+
+
+@pytest.mark.parametrize(
+    "kernel_backend", [KernelBackend.TRITON, KernelBackend.PYTORCH]
+)
+def test_l2_norm_postprocessor_zero_row_half(kernel_backend):
+    # eps^2 = 1e-12 underflows in fp16: it must stay fp32 after Module.half().
+    norm = L2NormEmbeddingPostprocessor(128, kernel_backend=kernel_backend).half()
+    x = torch.randn(16, 128, device="cuda", dtype=torch.float16)
+    x[3] = 0
+    # squares of |x| > 256 overflow fp16.
+    x[5] = 1000
+    y = norm(x)
+    assert not torch.isnan(y).any()
+    assert torch.all(y[3] == 0)
+    torch.testing.assert_close(
+        y[5], torch.full_like(y[5], 128**-0.5), atol=1e-3, rtol=1e-3
+    )